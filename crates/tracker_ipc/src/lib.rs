@@ -73,3 +73,30 @@ fn spawn_stdout_reader(stdout: std::process::ChildStdout, tx: Sender<TrackerFram
         }
     });
 }
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn test_parse_frame_with_array_landmarks() {
+        let line = r#"{"ts":1.5,"blendshapes":{"jawOpen":0.25},"pose_landmarks":[[0.5,0.5,-0.1,0.9,0.95]],"pose_world_landmarks":[[0.1,0.2,-0.3,0.8,0.9]]}"#;
+        let frame: TrackerFrame = serde_json::from_str(line).unwrap();
+
+        assert_eq!(frame.blendshapes["jawOpen"], 0.25);
+        assert_eq!(frame.pose_landmarks.len(), 1);
+        assert_eq!(frame.pose_landmarks[0].z, -0.1);
+        assert_eq!(frame.pose_landmarks[0].presence, 0.95);
+        assert_eq!(frame.pose_world_landmarks[0].x, 0.1);
+        assert_eq!(frame.pose_world_landmarks[0].visibility, 0.8);
+    }
+
+    #[test]
+    fn test_parse_frame_with_object_landmarks() {
+        let line = r#"{"ts":1.5,"blendshapes":{},"pose_landmarks":[{"x":0.5,"y":0.5,"z":-0.1,"visibility":0.9,"presence":0.95}]}"#;
+        let frame: TrackerFrame = serde_json::from_str(line).unwrap();
+
+        assert_eq!(frame.pose_landmarks[0].y, 0.5);
+        assert!(frame.pose_world_landmarks.is_empty());
+    }
+}
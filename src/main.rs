@@ -193,11 +193,14 @@ fn main() {
 fn setup_tracker(mut commands: Commands, config: Res<Config>) {
     // Use PYTHON_BIN environment variable if set, otherwise default to "python3"
     let python_bin = std::env::var("PYTHON_BIN").unwrap_or_else(|_| "python3".to_string());
+    // Use TRACKER_SCRIPT environment variable if set, otherwise the MediaPipe tracker
+    let tracker_script = std::env::var("TRACKER_SCRIPT")
+        .unwrap_or_else(|_| "tools/mediapipe_tracker.py".to_string()); // Relative Path
 
     let camera_device_id = config.inner.camera_device_id.to_string();
     let (child, rx) = spawn_tracker(
         &python_bin,
-        "tools/mediapipe_tracker.py", // Relative Path
+        &tracker_script,
         &["--camera", &camera_device_id],
     );
 
@@ -205,6 +208,7 @@ fn setup_tracker(mut commands: Commands, config: Res<Config>) {
     commands.insert_resource(TrackerProcess { child });
 
     println!("Tracker process started with Python: {python_bin}");
+    println!("Using tracker script: {tracker_script}");
     println!("Using camera device ID: {}", config.inner.camera_device_id);
 }
 
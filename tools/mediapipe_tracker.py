@@ -3,7 +3,16 @@ import time
 import sys
 import os
 import argparse
+import signal
+import queue
+import threading
+import multiprocessing
+from functools import partial
+from multiprocessing.shared_memory import SharedMemory
+from operator import attrgetter
 import cv2
+import numpy as np
+import orjson
 import mediapipe as mp
 from mediapipe.tasks import python
 from mediapipe.tasks.python import vision
@@ -17,6 +26,863 @@ POSE_MODEL_PATH = "tools/pose_landmarker_full.task"
 # Maximum consecutive frame read failures before exiting
 MAX_FRAME_FAILURES = 30
 
+# Requested capture format. MJPG keeps USB bandwidth low enough for full frame
+# rate, and 640x480 is already well above the landmark models' input sizes.
+# Cameras that do not support a setting silently keep their default.
+CAPTURE_FOURCC = "MJPG"
+CAPTURE_WIDTH = 640
+CAPTURE_HEIGHT = 480
+CAPTURE_FPS = 30
+
+# Set MP_GPU=1 to run inference on the TFLite GPU delegate instead of the CPU
+USE_GPU = os.environ.get("MP_GPU") == "1"
+
+# Set MP_PIN_CPUS=1 to pin capture/output and inference to separate CPU cores
+# (Linux only; ignored where CPU affinity is unsupported)
+PIN_CPUS = os.environ.get("MP_PIN_CPUS") == "1" and hasattr(os, "sched_setaffinity")
+
+# Maximum number of frames handed from capture to inference. A frame is only
+# decoded when this slot is free, so inference always gets the latest frame.
+FRAME_QUEUE_SIZE = 1
+
+# Seconds a pipeline stage waits on its input queue before re-checking for shutdown
+QUEUE_POLL_INTERVAL = 0.1
+
+# Seconds to wait for both face and pose results of a frame before emitting
+# whatever has arrived. LIVE_STREAM mode silently skips frames while busy;
+# such drops are normally detected as soon as a newer result arrives (see
+# ResultJoiner.add), so this is only a fallback.
+RESULT_TIMEOUT = 0.5
+
+# Pose is run on every POSE_EVERY_N-th frame while the face stays still and on
+# every frame once it moves; set POSE_EVERY_N=1 to run pose on every frame.
+# Read from the environment in main() (see pose_every_n).
+DEFAULT_POSE_EVERY_N = 2
+
+# L1 change of the normalized face bounding box (x0, y0, x1, y1) below which
+# the face counts as stationary
+FACE_MOTION_THRESHOLD = 0.02
+
+# Face mesh landmarks at the outer edge of the face (forehead, chin, right and
+# left cheek). Their extent approximates the face bounding box well enough to
+# detect motion, without touching all 478 landmarks.
+FACE_BBOX_LANDMARKS = (10, 152, 234, 454)
+
+# Marks a frame for which pose detection was skipped; the previous pose is
+# emitted again for it
+POSE_SKIPPED = object()
+
+# Marks a result the landmarker dropped, detected because a result for a
+# later frame arrived first
+RESULT_DROPPED = object()
+
+# Number of frame slots in the shared memory ring used by --multiprocess mode.
+# Bounds the frames in flight between capture and the worker processes.
+RING_SLOTS = 4
+
+# Seconds to wait for a worker process to exit after being asked to stop
+WORKER_JOIN_TIMEOUT = 5.0
+
+# Offset from the monotonic clock to wall-clock time, sampled once so frame
+# timestamps come from a single monotonic clock read
+WALL_CLOCK_OFFSET = time.time() - time.monotonic_ns() / 1e9
+
+# Frame rate and blink curves for --stub mode. Each curve is one ramp period,
+# precomputed so the loop only indexes into it.
+STUB_FPS = 10
+STUB_BLINK_LEFT = (np.arange(100) / 100.0).tolist()
+STUB_BLINK_RIGHT = (np.arange(80) / 80.0).tolist()
+
+# Decimal places kept for emitted landmark values. 1e-4 is far below what
+# the avatar can resolve, and shorter numbers shrink every output line.
+LANDMARK_DECIMALS = 4
+
+# Landmark fields in the order they are emitted for each landmark
+LANDMARK_FIELDS = ("x", "y", "z", "visibility", "presence")
+_landmark_fields = attrgetter(*LANDMARK_FIELDS)
+_landmark_xy = attrgetter("x", "y")
+
+# MediaPipe image constructor and format, bound once for the per-frame wrapper
+_mp_image = mp.Image
+_SRGB = mp.ImageFormat.SRGB
+
+# Blendshape category accessors used when extracting face results
+_blendshape_name = attrgetter("category_name")
+_blendshape_score = attrgetter("score")
+
+# orjson options for frame output: one JSON object per line, numpy values
+# serialized natively
+JSON_OPTIONS = orjson.OPT_APPEND_NEWLINE | orjson.OPT_SERIALIZE_NUMPY
+
+def get_or_stop(q, stop_event):
+    # Block on a queue until an item arrives or the pipeline is stopped.
+    # Returns None once stop_event is set.
+    while not stop_event.is_set():
+        try:
+            return q.get(timeout=QUEUE_POLL_INTERVAL)
+        except queue.Empty:
+            continue
+    return None
+
+class ResultJoiner:
+    # Pairs the asynchronous face and pose results sharing a timestamp and
+    # releases them in timestamp order. Results are stored already extracted
+    # (see extract_face / extract_pose). A dropped or timed out result is
+    # released as None.
+
+    def __init__(self, timeout):
+        self._timeout = timeout
+        self._pending = {}
+        self._cond = threading.Condition()
+
+    def submit(self, timestamp_ms, ts, run_pose=True):
+        # Must be called before the frame is handed to the landmarkers.
+        # Without run_pose the frame only waits for its face result.
+        with self._cond:
+            self._pending[timestamp_ms] = {
+                "ts": ts,
+                "deadline": time.monotonic() + self._timeout,
+                "face": None,
+                "pose": None if run_pose else POSE_SKIPPED,
+            }
+
+    def on_face(self, result, output_image, timestamp_ms):
+        # FaceLandmarker LIVE_STREAM result callback
+        self.add(timestamp_ms, "face", extract_face(result))
+
+    def on_pose(self, result, output_image, timestamp_ms):
+        # PoseLandmarker LIVE_STREAM result callback
+        self.add(timestamp_ms, "pose", extract_pose(result))
+
+    def add(self, timestamp_ms, kind, value):
+        with self._cond:
+            entry = self._pending.get(timestamp_ms)
+            if entry is None:
+                # Already emitted as a partial result after timing out
+                return
+            entry[kind] = value
+            # Each landmarker reports in timestamp order, so any older frame
+            # still waiting for this kind was dropped by it
+            for older_ms, older in self._pending.items():
+                if older_ms >= timestamp_ms:
+                    break
+                if older[kind] is None:
+                    older[kind] = RESULT_DROPPED
+            self._cond.notify()
+
+    def pop_ready(self, wait):
+        # Return (ts, face, pose) tuples that are complete or timed out,
+        # oldest first. A timed out result is None.
+        with self._cond:
+            ready = self._collect_ready()
+            if not ready:
+                self._cond.wait(wait)
+                ready = self._collect_ready()
+            return ready
+
+    def _collect_ready(self):
+        ready = []
+        now = time.monotonic()
+        # Timestamps are submitted in increasing order, so the dict is sorted
+        while self._pending:
+            timestamp_ms = next(iter(self._pending))
+            entry = self._pending[timestamp_ms]
+            complete = entry["face"] is not None and entry["pose"] is not None
+            if not complete and now < entry["deadline"]:
+                break
+            del self._pending[timestamp_ms]
+            face, pose = entry["face"], entry["pose"]
+            ready.append((
+                entry["ts"],
+                None if face is RESULT_DROPPED else face,
+                None if pose is RESULT_DROPPED else pose,
+            ))
+        return ready
+
+def face_landmarker_options(base_options, running_mode, result_callback=None):
+    return vision.FaceLandmarkerOptions(
+        base_options=base_options,
+        output_face_blendshapes=True,
+        running_mode=running_mode,
+        num_faces=1,
+        result_callback=result_callback
+    )
+
+def pose_landmarker_options(base_options, running_mode, result_callback=None):
+    return vision.PoseLandmarkerOptions(
+        base_options=base_options,
+        running_mode=running_mode,
+        result_callback=result_callback
+    )
+
+class PoseGate:
+    # Skips pose detection while the face is stationary, since the avatar's
+    # body rarely needs full-rate updates then. Fed with face bounding boxes
+    # in frame order by the serialize stage and queried when submitting a
+    # frame; decisions therefore lag the camera by the frames in flight.
+
+    def __init__(self, every_n, threshold):
+        self._every_n = every_n
+        self._threshold = threshold
+        self._prev_bbox = None
+        self._moving = True
+        self._skipped = 0
+
+    def update_face(self, bbox):
+        if bbox is None or self._prev_bbox is None:
+            # No face to judge motion by
+            self._moving = True
+        else:
+            self._moving = float(np.abs(bbox - self._prev_bbox).sum()) >= self._threshold
+        self._prev_bbox = bbox
+
+    def should_run_pose(self):
+        if self._moving or self._skipped + 1 >= self._every_n:
+            self._skipped = 0
+            return True
+        self._skipped += 1
+        return False
+
+def create_landmarker(landmarker_cls, make_options, model_path):
+    # Create a landmarker from options built around the given BaseOptions.
+    # The GPU delegate is not available on every platform (e.g. Windows), so
+    # any failure to create it falls back to the default CPU delegate.
+    if USE_GPU:
+        try:
+            base_options = python.BaseOptions(
+                model_asset_path=model_path,
+                delegate=python.BaseOptions.Delegate.GPU,
+            )
+            return landmarker_cls.create_from_options(make_options(base_options))
+        except Exception as e:
+            print(json.dumps({
+                "warning": f"GPU delegate unavailable for {model_path}, falling back to CPU: {e}"
+            }), file=sys.stderr, flush=True)
+
+    base_options = python.BaseOptions(model_asset_path=model_path)
+    return landmarker_cls.create_from_options(make_options(base_options))
+
+def physical_cores(cpus):
+    # Keep one logical CPU per physical core so inference threads do not share
+    # a core with their hyperthread siblings. Falls back to all CPUs when the
+    # topology is not exposed through sysfs.
+    seen = set()
+    cores = []
+    for cpu in cpus:
+        try:
+            with open(f"/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list") as f:
+                siblings = f.read().strip()
+        except OSError:
+            return list(cpus)
+        if siblings not in seen:
+            seen.add(siblings)
+            cores.append(cpu)
+    return cores
+
+def cpu_partitions():
+    # Split the CPUs available to this process into (io, face, pose) sets:
+    # one core is reserved for capture and output, and the remaining physical
+    # cores are shared out between the two landmarkers.
+    # Returns None when there are too few cores to partition.
+    cores = physical_cores(sorted(os.sched_getaffinity(0)))
+    if len(cores) < 3:
+        return None
+    inference = cores[1:]
+    half = len(inference) // 2
+    return {cores[0]}, set(inference[:half]), set(inference[half:])
+
+def pin_to_cpus(cpus):
+    # Restrict the calling thread to cpus. Threads and processes it starts
+    # afterwards inherit the restriction.
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+
+def run_stage(target, stop_event, *args):
+    # Run a pipeline stage, stopping the whole pipeline when it exits for any
+    # reason (error, broken stdout pipe, ...) so no stage is left running alone
+    try:
+        target(*args)
+    finally:
+        stop_event.set()
+
+class FrameQueueSink:
+    # Hands captured frames to the in-process inference stage. Frame buffers
+    # are recycled through a pool, so the steady state allocates no new
+    # frame arrays; the pool only ever holds the few frames in flight.
+
+    def __init__(self):
+        self.frames = queue.Queue(maxsize=FRAME_QUEUE_SIZE)
+        self.pool = queue.SimpleQueue()
+
+    def ready(self):
+        return not self.frames.full()
+
+    def buffer(self):
+        try:
+            return self.pool.get_nowait()
+        except queue.Empty:
+            return None
+
+    def put(self, frame, timestamp_ms, ts):
+        self.frames.put_nowait((frame, timestamp_ms, ts))
+
+class SharedFrameRing:
+    # Ring of RGB frame slots in shared memory for --multiprocess mode. Frames
+    # are decoded straight into a slot and only the slot index is sent to the
+    # worker processes, so pixel data is never pickled. A slot is reused once
+    # every worker has released it. pose_requests is None when pose is not
+    # tracked.
+
+    def __init__(self, shape, slots, joiner, gate, face_requests, pose_requests):
+        self.shape = shape
+        self.slots = slots
+        self.shm = SharedMemory(create=True, size=slots * int(np.prod(shape)))
+        self.views = np.ndarray((slots, *shape), dtype=np.uint8, buffer=self.shm.buf)
+        self._joiner = joiner
+        self._gate = gate
+        self._face_requests = face_requests
+        self._pose_requests = pose_requests
+        self._refs = [0] * slots
+        self._free = queue.SimpleQueue()
+        for slot in range(slots):
+            self._free.put(slot)
+        # Slot being decoded into; kept across a failed retrieve
+        self._slot = None
+        self._view = None
+
+    def ready(self):
+        return self._slot is not None or not self._free.empty()
+
+    def buffer(self):
+        if self._slot is None:
+            self._slot = self._free.get_nowait()
+            self._view = self.views[self._slot]
+        return self._view
+
+    def put(self, frame, timestamp_ms, ts):
+        slot, view = self._slot, self._view
+        self._slot = self._view = None
+        if frame is not view:
+            # OpenCV allocated a new array instead of decoding in place
+            np.copyto(view, frame)
+        cv2.cvtColor(view, cv2.COLOR_BGR2RGB, dst=view)
+
+        run_pose = self._pose_requests is not None and self._gate.should_run_pose()
+        self._refs[slot] = 2 if run_pose else 1
+        self._joiner.submit(timestamp_ms, ts, run_pose)
+        self._face_requests.put((slot, timestamp_ms))
+        if run_pose:
+            self._pose_requests.put((slot, timestamp_ms))
+
+    def release(self, slot):
+        self._refs[slot] -= 1
+        if self._refs[slot] == 0:
+            self._free.put(slot)
+
+    def close(self):
+        # Drop every view first; an exported buffer cannot be closed
+        self._view = None
+        del self.views
+        self.shm.close()
+        self.shm.unlink()
+
+def capture_stage(cap, sink, stop_event, errors):
+    # Stage A: read frames from the webcam into the sink.
+    # Frames are grabbed continuously so the driver never holds a backlog, but
+    # only decoded and handed over once the sink is ready for the next one.
+    # This trades dropped frames for bounded latency when inference is slower
+    # than the camera.
+    last_timestamp_ms = -1
+    consecutive_failures = 0
+
+    # Bound once so the hot loop only does local lookups
+    grab, retrieve = cap.grab, cap.retrieve
+    ready, buffer, put = sink.ready, sink.buffer, sink.put
+    monotonic_ns = time.monotonic_ns
+    stopped = stop_event.is_set
+
+    while not stopped():
+        success = grab()
+        if success and not ready():
+            # Inference is still busy; skip this frame without decoding it
+            continue
+        if success:
+            success, frame = retrieve(buffer())
+        if not success:
+            consecutive_failures += 1
+            if consecutive_failures >= MAX_FRAME_FAILURES:
+                errors.append(
+                    f"Failed to read {MAX_FRAME_FAILURES} consecutive frames. Possible causes: webcam disconnected, permission denied, or device error."
+                )
+                return
+            continue
+
+        # Reset failure counter on successful read
+        consecutive_failures = 0
+
+        # Stamp the frame at capture time. MediaPipe needs strictly increasing
+        # millisecond timestamps; real time deltas also keep its landmark
+        # smoothing filters correctly tuned.
+        now_ns = monotonic_ns()
+        timestamp_ms = max(now_ns // 1_000_000, last_timestamp_ms + 1)
+        last_timestamp_ms = timestamp_ms
+
+        put(frame, timestamp_ms, WALL_CLOCK_OFFSET + now_ns / 1e9)
+
+def to_mp_image(rgb_frame):
+    # Wrap an RGB frame for MediaPipe. mp.Image copies the pixels into an
+    # immutable buffer it owns and has no way to refill it, so a cached
+    # wrapper cannot be reused across frames; one is built per frame.
+    # Depending on the MediaPipe version, the constructor either copies
+    # non-contiguous input or reads the raw buffer ignoring strides, so make
+    # sure the frame is packed first. The scratch buffer and ring slots
+    # already are, making this a flag check in practice.
+    if not rgb_frame.flags.c_contiguous:
+        rgb_frame = np.ascontiguousarray(rgb_frame)
+    return _mp_image(image_format=_SRGB, data=rgb_frame)
+
+def make_detect(face_landmarker, pose_landmarker, joiner, gate):
+    # Build the per-frame detect function for the threaded mode. Each mode
+    # gets its own closure, so the inference loop runs one branch-free path.
+    submit = joiner.submit
+    detect_face = face_landmarker.detect_async
+
+    if pose_landmarker is None:
+        def detect(mp_image, timestamp_ms, ts):
+            submit(timestamp_ms, ts, False)
+            detect_face(mp_image, timestamp_ms)
+        return detect
+
+    detect_pose = pose_landmarker.detect_async
+    should_run_pose = gate.should_run_pose
+
+    def detect(mp_image, timestamp_ms, ts):
+        # Detect face and pose back-to-back so both graphs run concurrently
+        run_pose = should_run_pose()
+        submit(timestamp_ms, ts, run_pose)
+        detect_face(mp_image, timestamp_ms)
+        if run_pose:
+            detect_pose(mp_image, timestamp_ms)
+    return detect
+
+def inference_stage(detect, sink, stop_event):
+    # Stage B: convert captured frames and hand them to detect (see
+    # make_detect), which submits them to the landmarkers asynchronously.
+
+    # RGB scratch buffer reused across frames. mp.Image copies the pixel data
+    # into its own buffer on construction, so overwriting it next frame is safe.
+    # A reversed-channel view (frame[:, :, ::-1]) would not help, since
+    # to_mp_image needs C-contiguous data and would copy the view anyway.
+    rgb_frame = None
+
+    # Bound once so the hot loop only does local lookups
+    frames, release = sink.frames, sink.pool.put
+    cvt_color, bgr2rgb = cv2.cvtColor, cv2.COLOR_BGR2RGB
+
+    while True:
+        item = get_or_stop(frames, stop_event)
+        if item is None:
+            return
+        frame, timestamp_ms, ts = item
+
+        # Convert BGR to RGB into the scratch buffer
+        if rgb_frame is None or rgb_frame.shape != frame.shape:
+            rgb_frame = np.empty_like(frame)
+        cvt_color(frame, bgr2rgb, dst=rgb_frame)
+
+        # The BGR frame is no longer needed; hand it back for the next capture
+        release(frame)
+
+        # Create MediaPipe Image, shared by both landmarkers
+        detect(to_mp_image(rgb_frame), timestamp_ms, ts)
+
+def landmarker_worker(kind, shm_name, shape, slots, requests, results, cpus=None):
+    # Worker process for --multiprocess mode: runs one landmarker on frames
+    # read zero-copy from the shared memory ring and sends back extracted
+    # results as (kind, slot, timestamp_ms, value)
+    # Ctrl+C is handled by the main process, which stops workers via a None request
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    pin_to_cpus(cpus)
+
+    shm = SharedMemory(name=shm_name)
+    views = np.ndarray((slots, *shape), dtype=np.uint8, buffer=shm.buf)
+
+    if kind == "face":
+        landmarker_cls, make_options, model_path, extract = (
+            vision.FaceLandmarker, face_landmarker_options, FACE_MODEL_PATH, extract_face)
+    else:
+        landmarker_cls, make_options, model_path, extract = (
+            vision.PoseLandmarker, pose_landmarker_options, POSE_MODEL_PATH, extract_pose)
+
+    # Each process owns a single graph, so the synchronous VIDEO mode is enough
+    landmarker = create_landmarker(
+        landmarker_cls,
+        partial(make_options, running_mode=vision.RunningMode.VIDEO),
+        model_path,
+    )
+
+    try:
+        while True:
+            item = requests.get()
+            if item is None:
+                break
+            slot, timestamp_ms = item
+            mp_image = to_mp_image(views[slot])
+            result = landmarker.detect_for_video(mp_image, timestamp_ms)
+            results.put((kind, slot, timestamp_ms, extract(result)))
+    finally:
+        landmarker.close()
+        del views
+        shm.close()
+
+def merge_stage(results, ring, joiner, stop_event):
+    # Stage B (--multiprocess mode): collect worker results into the joiner,
+    # releasing ring slots as the workers finish with them
+    while True:
+        item = get_or_stop(results, stop_event)
+        if item is None:
+            return
+        kind, slot, timestamp_ms, value = item
+        ring.release(slot)
+        joiner.add(timestamp_ms, kind, value)
+
+def landmarks_to_array(landmarks):
+    # Pack landmarks into an (N, 5) float32 array with one
+    # [x, y, z, visibility, presence] row per landmark, rounded to
+    # LANDMARK_DECIMALS, which orjson serializes directly as nested arrays
+    array = np.array([_landmark_fields(lm) for lm in landmarks], dtype=np.float32)
+    return np.round(array, LANDMARK_DECIMALS, out=array)
+
+def extract_face(face_result):
+    # Returns (blendshapes, bbox); bbox is None when no face was found
+
+    # Extract blendshapes
+    blendshapes = {}
+    if face_result.face_blendshapes and len(face_result.face_blendshapes) > 0:
+        categories = face_result.face_blendshapes[0]
+        blendshapes = dict(zip(map(_blendshape_name, categories), map(_blendshape_score, categories)))
+
+    # Normalized face bounding box (x0, y0, x1, y1), used to detect motion
+    bbox = None
+    if face_result.face_landmarks and len(face_result.face_landmarks) > 0:
+        landmarks = face_result.face_landmarks[0]
+        points = np.array([_landmark_xy(landmarks[i]) for i in FACE_BBOX_LANDMARKS], dtype=np.float32)
+        bbox = np.concatenate((points.min(axis=0), points.max(axis=0)))
+
+    return blendshapes, bbox
+
+def extract_pose(pose_result):
+    # Extract pose landmarks (33 3D landmarks in image coordinates)
+    pose_landmarks = []
+    if pose_result.pose_landmarks and len(pose_result.pose_landmarks) > 0:
+        pose_landmarks = landmarks_to_array(pose_result.pose_landmarks[0])
+
+    # Extract pose world landmarks (33 3D landmarks in real-world coordinates)
+    pose_world_landmarks = []
+    if pose_result.pose_world_landmarks and len(pose_result.pose_world_landmarks) > 0:
+        pose_world_landmarks = landmarks_to_array(pose_result.pose_world_landmarks[0])
+
+    return pose_landmarks, pose_world_landmarks
+
+def build_output(ts, face, pose):
+    # Either extracted result may be None when it did not arrive in time
+    blendshapes = face[0] if face is not None else {}
+    pose_landmarks, pose_world_landmarks = pose if pose is not None else ([], [])
+
+    # Output frame data in the expected format
+    return {
+        "ts": ts,
+        "blendshapes": blendshapes,
+        "pose_landmarks": pose_landmarks,
+        "pose_world_landmarks": pose_world_landmarks
+    }
+
+def serialize_stage(joiner, lines, gate, stop_event):
+    # Stage C: encode joined results as line-delimited JSON for the writer.
+    # Frames arrive in order here, so this is also where the pose gate learns
+    # about face motion and where skipped poses are filled in. A dropped face
+    # result reuses the last blendshapes, since an empty map would reset the
+    # avatar to a neutral face.
+    last_face = None
+    last_pose = None
+
+    # Bound once so the hot loop only does local lookups
+    pop_ready, update_face, put = joiner.pop_ready, gate.update_face, lines.put
+    dumps, options = orjson.dumps, JSON_OPTIONS
+    stopped = stop_event.is_set
+
+    while not stopped():
+        for ts, face, pose in pop_ready(QUEUE_POLL_INTERVAL):
+            if pose is POSE_SKIPPED:
+                pose = last_pose
+            elif pose is not None:
+                last_pose = pose
+            if face is None and pose is None:
+                # Frame was dropped by both landmarkers
+                continue
+            if face is None:
+                face = last_face
+                if face is None:
+                    # No face result has arrived yet
+                    continue
+            else:
+                last_face = face
+                update_face(face[1])
+            put(dumps(build_output(ts, face, pose), option=options))
+
+def writer_stage(lines, stop_event):
+    # Stage D: write encoded lines to stdout. Lines that queued up while the
+    # previous write was in progress are written and flushed together, which
+    # amortizes the write syscall under load without ever delaying a line.
+    # orjson encodes straight to bytes, so bypass the text layer of stdout.
+    stdout = sys.stdout.buffer
+    write, flush = stdout.write, stdout.flush
+    get_nowait = lines.get_nowait
+    while True:
+        line = get_or_stop(lines, stop_event)
+        if line is None:
+            return
+
+        batch = [line]
+        while True:
+            try:
+                batch.append(get_nowait())
+            except queue.Empty:
+                break
+
+        write(b"".join(batch))
+        flush()
+
+def run_stub():
+    # Emit synthetic blink frames without a webcam or models, for exercising
+    # the Rust side on its own. One frame dict is reused and updated in place.
+    # Frames are paced against absolute monotonic deadlines, so encoding time
+    # and late wake-ups do not accumulate into drift over long runs.
+    frame = {
+        "ts": 0.0,
+        "blendshapes": {"eyeBlinkLeft": 0.0, "eyeBlinkRight": 0.0},
+    }
+    blendshapes = frame["blendshapes"]
+    stdout = sys.stdout.buffer
+
+    # Bound once so the hot loop only does local lookups
+    write, flush = stdout.write, stdout.flush
+    dumps, options = orjson.dumps, JSON_OPTIONS
+    now, monotonic, sleep = time.time, time.monotonic, time.sleep
+    left, right = STUB_BLINK_LEFT, STUB_BLINK_RIGHT
+    left_len, right_len = len(left), len(right)
+
+    interval = 1.0 / STUB_FPS
+    next_deadline = monotonic()
+    i = 0
+    try:
+        while True:
+            frame["ts"] = now()
+            blendshapes["eyeBlinkLeft"] = left[i % left_len]
+            blendshapes["eyeBlinkRight"] = right[i % right_len]
+            write(dumps(frame, option=options))
+            flush()
+            i += 1
+
+            next_deadline += interval
+            delay = next_deadline - monotonic()
+            if delay > 0:
+                sleep(delay)
+            elif delay < -interval:
+                # Fell more than a frame behind (e.g. suspended); resync
+                # instead of bursting out the missed frames
+                next_deadline = monotonic()
+    except KeyboardInterrupt:
+        pass
+
+def start_stage(name, target, stop_event, *args):
+    stage = threading.Thread(
+        target=run_stage,
+        args=(target, stop_event, *args),
+        name=name,
+        daemon=True,
+    )
+    stage.start()
+    return stage
+
+def wait_for_stop(stop_event):
+    # Block until a stage stops the pipeline or the user interrupts it.
+    # Wait on the event with a timeout so KeyboardInterrupt is delivered.
+    try:
+        while not stop_event.wait(QUEUE_POLL_INTERVAL):
+            pass
+    except KeyboardInterrupt:
+        pass
+    stop_event.set()
+
+def watch_workers(workers, stop_event, errors):
+    # Stop the pipeline if a worker process dies, e.g. failing to load its model
+    while not stop_event.wait(QUEUE_POLL_INTERVAL):
+        for worker in workers:
+            if not worker.is_alive():
+                errors.append(
+                    f"{worker.name} process exited unexpectedly (exit code {worker.exitcode})."
+                )
+                return
+
+def probe_frame_shape(cap):
+    # Read one frame to learn the negotiated capture resolution
+    for _ in range(MAX_FRAME_FAILURES):
+        success, frame = cap.read()
+        if success:
+            return frame.shape
+    return None
+
+def run_threaded(cap, joiner, lines, gate, stop_event, errors, partitions, track_pose):
+    # Both landmarkers live in this process and run asynchronously on
+    # MediaPipe's own threads, reporting back to the joiner
+
+    # MediaPipe starts its threads while the landmarkers are created, so they
+    # inherit whatever affinity this thread has at that point
+    if partitions:
+        io_cpus, face_cpus, pose_cpus = partitions
+        pin_to_cpus(face_cpus | pose_cpus)
+
+    # Initialize MediaPipe Face Landmarker
+    face_landmarker = create_landmarker(
+        vision.FaceLandmarker,
+        partial(
+            face_landmarker_options,
+            running_mode=vision.RunningMode.LIVE_STREAM,
+            result_callback=joiner.on_face,
+        ),
+        FACE_MODEL_PATH,
+    )
+
+    # Initialize MediaPipe Pose Landmarker
+    pose_landmarker = None
+    if track_pose:
+        pose_landmarker = create_landmarker(
+            vision.PoseLandmarker,
+            partial(
+                pose_landmarker_options,
+                running_mode=vision.RunningMode.LIVE_STREAM,
+                result_callback=joiner.on_pose,
+            ),
+            POSE_MODEL_PATH,
+        )
+
+    # The pipeline stages started below inherit the reserved core
+    if partitions:
+        pin_to_cpus(io_cpus)
+
+    sink = FrameQueueSink()
+    detect = make_detect(face_landmarker, pose_landmarker, joiner, gate)
+    stages = []
+    try:
+        stages.append(start_stage("capture", capture_stage, stop_event, cap, sink, stop_event, errors))
+        stages.append(start_stage("inference", inference_stage, stop_event, detect, sink, stop_event))
+        stages.append(start_stage("serialize", serialize_stage, stop_event, joiner, lines, gate, stop_event))
+        stages.append(start_stage("writer", writer_stage, stop_event, lines, stop_event))
+        wait_for_stop(stop_event)
+    finally:
+        stop_event.set()
+        for stage in stages:
+            stage.join()
+        face_landmarker.close()
+        if pose_landmarker is not None:
+            pose_landmarker.close()
+
+def run_multiprocess(cap, joiner, lines, gate, stop_event, errors, partitions, track_pose):
+    # Face and pose landmarkers run in separate worker processes so their
+    # pre/post-processing does not contend for this process's GIL. Frames are
+    # shared through a ring buffer in shared memory.
+    shape = probe_frame_shape(cap)
+    if shape is None:
+        errors.append(
+            f"Failed to read {MAX_FRAME_FAILURES} consecutive frames. Possible causes: webcam disconnected, permission denied, or device error."
+        )
+        return
+
+    # spawn gives the workers a clean interpreter on every platform instead of
+    # forking a process that already holds the camera and several threads
+    context = multiprocessing.get_context("spawn")
+    face_requests = context.Queue()
+    pose_requests = context.Queue() if track_pose else None
+    results = context.Queue()
+    ring = SharedFrameRing(shape, RING_SLOTS, joiner, gate, face_requests, pose_requests)
+
+    workers = [
+        context.Process(
+            target=landmarker_worker,
+            args=(kind, ring.shm.name, shape, RING_SLOTS, requests, results, cpus),
+            name=f"{kind}-worker",
+            daemon=True,
+        )
+        for kind, requests, cpus in (
+            ("face", face_requests, partitions[1] if partitions else None),
+            ("pose", pose_requests, partitions[2] if partitions else None),
+        )
+        if requests is not None
+    ]
+
+    stages = []
+    try:
+        for worker in workers:
+            worker.start()
+        # Capture and output stay on the reserved core, away from the workers
+        if partitions:
+            pin_to_cpus(partitions[0])
+        stages.append(start_stage("watch", watch_workers, stop_event, workers, stop_event, errors))
+        stages.append(start_stage("capture", capture_stage, stop_event, cap, ring, stop_event, errors))
+        stages.append(start_stage("merge", merge_stage, stop_event, results, ring, joiner, stop_event))
+        stages.append(start_stage("serialize", serialize_stage, stop_event, joiner, lines, gate, stop_event))
+        stages.append(start_stage("writer", writer_stage, stop_event, lines, stop_event))
+        wait_for_stop(stop_event)
+    finally:
+        stop_event.set()
+        for stage in stages:
+            stage.join()
+        for requests in (face_requests, pose_requests):
+            if requests is not None:
+                requests.put(None)
+        for worker in workers:
+            worker.join(WORKER_JOIN_TIMEOUT)
+            if worker.is_alive():
+                worker.terminate()
+        ring.close()
+
+def open_camera(camera_device_id):
+    # Open and configure the webcam, exiting with an error if it is unavailable
+    cap = cv2.VideoCapture(camera_device_id)
+    if not cap.isOpened():
+        print(json.dumps({
+            "error": f"Failed to open webcam (device index {camera_device_id}). Please check that a webcam is connected and accessible."
+        }), file=sys.stderr, flush=True)
+        sys.exit(1)
+
+    # Request a compressed stream at a moderate resolution
+    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*CAPTURE_FOURCC))
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAPTURE_WIDTH)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAPTURE_HEIGHT)
+    cap.set(cv2.CAP_PROP_FPS, CAPTURE_FPS)
+
+    # Keep the driver from buffering frames so each grab returns a fresh one
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    return cap
+
+def pose_every_n():
+    # Parse POSE_EVERY_N from the environment, exiting with an error message
+    # on anything but a positive integer
+    value = os.environ.get("POSE_EVERY_N")
+    if value is None:
+        return DEFAULT_POSE_EVERY_N
+    try:
+        every_n = int(value)
+    except ValueError:
+        every_n = 0
+    if every_n < 1:
+        print(json.dumps({
+            "error": f"Invalid POSE_EVERY_N value {value!r}. It must be a positive integer."
+        }), file=sys.stderr, flush=True)
+        sys.exit(1)
+    return every_n
+
 def main():
     parser = argparse.ArgumentParser(description="MediaPipe face and pose tracker")
     parser.add_argument(
@@ -25,9 +891,27 @@ def main():
         default=0,
         help="Video device index to use (default: 0)",
     )
+    parser.add_argument(
+        "--mode",
+        choices=("full", "face", "stub"),
+        default="full",
+        help="What to track: face and pose (full), face only (face), or "
+             "synthetic blink frames without a webcam (stub) (default: full)",
+    )
+    parser.add_argument(
+        "--multiprocess",
+        action="store_true",
+        help="Run the face and pose landmarkers in separate worker processes",
+    )
     args = parser.parse_args()
     camera_device_id = args.camera
 
+    if args.mode == "stub":
+        run_stub()
+        return
+    track_pose = args.mode == "full"
+    every_n = pose_every_n()
+
     # Check if face model file exists
     if not os.path.exists(FACE_MODEL_PATH):
         print(json.dumps({
@@ -36,122 +920,33 @@ def main():
         sys.exit(1)
     
     # Check if pose model file exists
-    if not os.path.exists(POSE_MODEL_PATH):
+    if track_pose and not os.path.exists(POSE_MODEL_PATH):
         print(json.dumps({
             "error": f"Pose model file not found at {POSE_MODEL_PATH}. Please download it from: https://storage.googleapis.com/mediapipe-models/pose_landmarker/pose_landmarker_full/float16/1/pose_landmarker_full.task"
         }), file=sys.stderr, flush=True)
         sys.exit(1)
     
-    # Initialize MediaPipe Face Landmarker
-    face_base_options = python.BaseOptions(model_asset_path=FACE_MODEL_PATH)
-    face_options = vision.FaceLandmarkerOptions(
-        base_options=face_base_options,
-        output_face_blendshapes=True,
-        running_mode=vision.RunningMode.VIDEO,
-        num_faces=1
-    )
-    
-    face_landmarker = vision.FaceLandmarker.create_from_options(face_options)
-    
-    # Initialize MediaPipe Pose Landmarker
-    pose_base_options = python.BaseOptions(model_asset_path=POSE_MODEL_PATH)
-    pose_options = vision.PoseLandmarkerOptions(
-        base_options=pose_base_options,
-        running_mode=vision.RunningMode.VIDEO
-    )
-    
-    pose_landmarker = vision.PoseLandmarker.create_from_options(pose_options)
-    
-    # Open webcam
-    cap = cv2.VideoCapture(camera_device_id)
-    if not cap.isOpened():
-        print(json.dumps({
-            "error": f"Failed to open webcam (device index {camera_device_id}). Please check that a webcam is connected and accessible."
-        }), file=sys.stderr, flush=True)
-        sys.exit(1)
-    
-    frame_count = 0
-    consecutive_failures = 0
-    
+    cap = open_camera(camera_device_id)
+
+    # Face and pose results arrive asynchronously and are joined here
+    joiner = ResultJoiner(RESULT_TIMEOUT)
+    gate = PoseGate(every_n, FACE_MOTION_THRESHOLD)
+    partitions = cpu_partitions() if PIN_CPUS else None
+    lines = queue.Queue()
+    stop_event = threading.Event()
+    errors = []
+
     try:
-        while True:
-            success, frame = cap.read()
-            if not success:
-                consecutive_failures += 1
-                if consecutive_failures >= MAX_FRAME_FAILURES:
-                    print(json.dumps({
-                        "error": f"Failed to read {MAX_FRAME_FAILURES} consecutive frames. Possible causes: webcam disconnected, permission denied, or device error."
-                    }), file=sys.stderr, flush=True)
-                    sys.exit(1)
-                continue
-            
-            # Reset failure counter on successful read
-            consecutive_failures = 0
-            
-            # Convert BGR to RGB
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            
-            # Create MediaPipe Image
-            mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_frame)
-            
-            # Use frame count as timestamp to ensure monotonically increasing values
-            # MediaPipe VIDEO mode requires timestamps in milliseconds
-            timestamp_ms = frame_count
-            
-            # Detect face landmarks and blendshapes
-            face_result = face_landmarker.detect_for_video(mp_image, timestamp_ms)
-            
-            # Extract blendshapes
-            blendshapes = {}
-            if face_result.face_blendshapes and len(face_result.face_blendshapes) > 0:
-                for blendshape in face_result.face_blendshapes[0]:
-                    blendshapes[blendshape.category_name] = blendshape.score
-            
-            # Detect pose landmarks
-            pose_result = pose_landmarker.detect_for_video(mp_image, timestamp_ms)
-            
-            # Extract pose landmarks (33 3D landmarks in image coordinates)
-            pose_landmarks = []
-            if pose_result.pose_landmarks and len(pose_result.pose_landmarks) > 0:
-                for landmark in pose_result.pose_landmarks[0]:
-                    pose_landmarks.append({
-                        "x": landmark.x,
-                        "y": landmark.y,
-                        "z": landmark.z,
-                        "visibility": landmark.visibility,
-                        "presence": landmark.presence
-                    })
-            
-            # Extract pose world landmarks (33 3D landmarks in real-world coordinates)
-            pose_world_landmarks = []
-            if pose_result.pose_world_landmarks and len(pose_result.pose_world_landmarks) > 0:
-                for landmark in pose_result.pose_world_landmarks[0]:
-                    pose_world_landmarks.append({
-                        "x": landmark.x,
-                        "y": landmark.y,
-                        "z": landmark.z,
-                        "visibility": landmark.visibility,
-                        "presence": landmark.presence
-                    })
-            
-            # Output frame data in the expected format
-            output = {
-                "ts": time.time(),
-                "blendshapes": blendshapes,
-                "pose_landmarks": pose_landmarks,
-                "pose_world_landmarks": pose_world_landmarks
-            }
-            
-            print(json.dumps(output), flush=True)
-            
-            frame_count += 1
-            
-    except KeyboardInterrupt:
-        pass
+        if args.multiprocess:
+            run_multiprocess(cap, joiner, lines, gate, stop_event, errors, partitions, track_pose)
+        else:
+            run_threaded(cap, joiner, lines, gate, stop_event, errors, partitions, track_pose)
     finally:
         cap.release()
-        face_landmarker.close()
-        pose_landmarker.close()
+
+    if errors:
+        print(json.dumps({"error": errors[0]}), file=sys.stderr, flush=True)
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
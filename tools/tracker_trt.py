@@ -0,0 +1,543 @@
+import json
+import sys
+import os
+import argparse
+import itertools
+import queue
+import threading
+import cv2
+import numpy as np
+import orjson
+import onnxruntime as ort
+
+# Shares the capture and output pipeline with the MediaPipe tracker, so the
+# stdout protocol is identical and the Rust application cannot tell them apart
+import mediapipe_tracker as tracker
+
+# Path to the ONNX model files (not distributed, see tools/README.md)
+# Face detector: RGB frame in, face boxes with 6 keypoints out
+FACE_DETECTOR_MODEL_PATH = "tools/face_detector.onnx"
+# Face mesh model: RGB face crop in, 478 face landmarks out
+FACE_MODEL_PATH = "tools/face_landmarks.onnx"
+# Blendshape model: 146 face landmarks in, 52 MediaPipe blendshape scores out
+BLENDSHAPE_MODEL_PATH = "tools/face_blendshapes.onnx"
+# Pose detector: RGB frame in, person boxes with 4 keypoints out
+POSE_DETECTOR_MODEL_PATH = "tools/pose_detector.onnx"
+# Pose model: MediaPipe pose_landmark_full exported to ONNX
+POSE_MODEL_PATH = "tools/pose_landmarks.onnx"
+
+# Execution providers in order of preference; unavailable ones are skipped.
+# TensorRT runs in FP16 and caches built engines next to the models, since
+# building them takes minutes on first start.
+PROVIDERS = [
+    ("TensorrtExecutionProvider", {
+        "trt_fp16_enable": True,
+        "trt_engine_cache_enable": True,
+        "trt_engine_cache_path": "tools/trt_cache",
+    }),
+    ("CUDAExecutionProvider", {}),
+    ("CPUExecutionProvider", {}),
+]
+
+# Providers that keep tensors in CUDA device memory
+CUDA_PROVIDERS = {"TensorrtExecutionProvider", "CUDAExecutionProvider"}
+
+# Detector output layout: per anchor box regressors (center offset, size and
+# keypoint offsets in input pixels) and score logits. The strides define the
+# SSD anchor grid of MediaPipe's face (BlazeFace short range) and pose
+# detectors.
+DETECTOR_BOXES_OUTPUT = 0
+DETECTOR_SCORES_OUTPUT = 1
+FACE_DETECTOR_STRIDES = (8, 16, 16, 16)
+POSE_DETECTOR_STRIDES = (8, 16, 32, 32, 32)
+
+# Detection probability below which no subject is reported
+DETECTION_THRESHOLD = 0.5
+
+# Regions of interest are squares around the subject, enlarged by these
+# factors and rotated upright, as in MediaPipe's landmarker graphs. The face
+# ROI is levelled by the eye corner landmarks, the pose ROI is centered on
+# and aligned with the hip center and body scale auxiliary landmarks.
+FACE_ROI_SCALE = 1.5
+POSE_ROI_SCALE = 1.25
+FACE_ROI_LANDMARKS = (33, 263)
+POSE_ROI_LANDMARKS = (33, 34)
+
+# Smallest ROI side in frame pixels worth cropping; degenerate landmarks or
+# detections below it count as no subject
+MIN_ROI_SIZE = 8.0
+
+# Face mesh model output layout: 478 landmarks of [x, y, z] in input pixels,
+# and a face presence logit
+FACE_LANDMARKS_OUTPUT = 0
+FACE_PRESENCE_OUTPUT = 1
+FACE_NUM_LANDMARKS = 478
+
+# Face presence probability below which no face is reported
+FACE_PRESENCE_THRESHOLD = 0.5
+
+# Face mesh landmarks fed to the blendshape model, in its input order. This is
+# the subset MediaPipe's face blendshapes graph selects.
+BLENDSHAPE_LANDMARKS = np.array([
+    0, 1, 4, 5, 6, 7, 8, 10, 13, 14, 17, 21, 33, 37, 39, 40, 46, 52, 53, 54,
+    55, 58, 61, 63, 65, 66, 67, 70, 78, 80, 81, 82, 84, 87, 88, 91, 93, 95,
+    103, 105, 107, 109, 127, 132, 133, 136, 144, 145, 146, 148, 149, 150, 152,
+    153, 154, 155, 157, 158, 159, 160, 161, 162, 163, 168, 172, 173, 176, 178,
+    181, 185, 191, 195, 197, 234, 246, 249, 251, 263, 267, 269, 270, 276, 282,
+    283, 284, 285, 288, 291, 293, 295, 296, 297, 300, 308, 310, 311, 312, 314,
+    317, 318, 321, 323, 324, 332, 334, 336, 338, 356, 361, 362, 365, 373, 374,
+    375, 377, 378, 379, 380, 381, 382, 384, 385, 386, 387, 388, 389, 390, 397,
+    398, 400, 402, 405, 409, 415, 454, 466, 468, 469, 470, 471, 472, 473, 474,
+    475, 476, 477,
+])
+
+# Blendshape names in the order of the blendshape model's output scores,
+# matching MediaPipe Face Landmarker's categories
+BLENDSHAPE_NAMES = (
+    "_neutral", "browDownLeft", "browDownRight", "browInnerUp",
+    "browOuterUpLeft", "browOuterUpRight", "cheekPuff", "cheekSquintLeft",
+    "cheekSquintRight", "eyeBlinkLeft", "eyeBlinkRight", "eyeLookDownLeft",
+    "eyeLookDownRight", "eyeLookInLeft", "eyeLookInRight", "eyeLookOutLeft",
+    "eyeLookOutRight", "eyeLookUpLeft", "eyeLookUpRight", "eyeSquintLeft",
+    "eyeSquintRight", "eyeWideLeft", "eyeWideRight", "jawForward", "jawLeft",
+    "jawOpen", "jawRight", "mouthClose", "mouthDimpleLeft", "mouthDimpleRight",
+    "mouthFrownLeft", "mouthFrownRight", "mouthFunnel", "mouthLeft",
+    "mouthLowerDownLeft", "mouthLowerDownRight", "mouthPressLeft",
+    "mouthPressRight", "mouthPucker", "mouthRight", "mouthRollLower",
+    "mouthRollUpper", "mouthShrugLower", "mouthShrugUpper", "mouthSmileLeft",
+    "mouthSmileRight", "mouthStretchLeft", "mouthStretchRight",
+    "mouthUpperUpLeft", "mouthUpperUpRight", "noseSneerLeft", "noseSneerRight",
+)
+
+# Pose model output layout: 39 landmarks (33 body + 6 auxiliary) of
+# [x, y, z, visibility, presence] in input pixels and logits, a pose presence
+# logit, and 39 world landmarks of [x, y, z] in meters
+POSE_LANDMARKS_OUTPUT = 0
+POSE_PRESENCE_OUTPUT = 1
+POSE_WORLD_LANDMARKS_OUTPUT = 4
+POSE_NUM_LANDMARKS = 33
+
+# Pose presence probability below which no pose is reported
+POSE_PRESENCE_THRESHOLD = 0.5
+
+# Number of input buffer sets per model. With two, frame N is preprocessed
+# and uploaded while frame N-1 is still being inferred.
+INPUT_BUFFERS = 2
+
+def select_providers():
+    available = set(ort.get_available_providers())
+    providers = [(name, options) for name, options in PROVIDERS if name in available]
+    if not providers:
+        raise ValueError(f"no supported execution provider, available: {sorted(available)}")
+    return providers
+
+# A region of interest is (center_x, center_y, size, rotation): a square in
+# frame pixels, rotated clockwise by rotation radians
+
+def full_frame_roi(frame_shape):
+    # The whole frame, letterboxed into a square
+    frame_height, frame_width = frame_shape[:2]
+    return frame_width / 2, frame_height / 2, max(frame_width, frame_height), 0.0
+
+def roi_rotation(start, end, target_angle):
+    # Rotation that brings the start -> end direction to target_angle, with
+    # angles counter-clockwise from the x axis like MediaPipe
+    angle = target_angle - np.arctan2(-(end[1] - start[1]), end[0] - start[0])
+    return float(angle - 2 * np.pi * np.floor((angle + np.pi) / (2 * np.pi)))
+
+def rect_roi(points, start, end, target_angle, scale):
+    # Square around the bounding box of points, enlarged by scale
+    x0, y0 = points.min(axis=0)
+    x1, y1 = points.max(axis=0)
+    size = max(x1 - x0, y1 - y0) * scale
+    return (x0 + x1) / 2, (y0 + y1) / 2, size, roi_rotation(start, end, target_angle)
+
+def alignment_roi(center, edge, target_angle, scale):
+    # Square centered on center whose half size is the distance to edge,
+    # enlarged by scale
+    size = 2 * np.hypot(edge[0] - center[0], edge[1] - center[1]) * scale
+    return center[0], center[1], size, roi_rotation(center, edge, target_angle)
+
+def face_detection_roi(box, keypoints):
+    # Levelled by the eyes, which are the first two keypoints
+    return rect_roi(box, keypoints[0], keypoints[1], 0.0, FACE_ROI_SCALE)
+
+def face_landmarks_roi(points):
+    start, end = FACE_ROI_LANDMARKS
+    return rect_roi(points, points[start], points[end], 0.0, FACE_ROI_SCALE)
+
+def pose_detection_roi(box, keypoints):
+    # Centered on the hips (keypoint 0) and sized by the circle around the
+    # body (keypoint 1)
+    return alignment_roi(keypoints[0], keypoints[1], np.pi / 2, POSE_ROI_SCALE)
+
+def pose_landmarks_roi(points):
+    center, edge = POSE_ROI_LANDMARKS
+    return alignment_roi(points[center], points[edge], np.pi / 2, POSE_ROI_SCALE)
+
+def checked_roi(roi):
+    return roi if roi[2] >= MIN_ROI_SIZE else None
+
+def roi_matrix(roi, input_size):
+    # Affine matrix mapping model input pixels to frame pixels for a ROI
+    center_x, center_y, size, rotation = roi
+    scale = size / input_size
+    cos, sin = scale * np.cos(rotation), scale * np.sin(rotation)
+    half = input_size / 2
+    return np.array([
+        [cos, -sin, center_x - half * (cos - sin)],
+        [sin, cos, center_y - half * (sin + cos)],
+    ])
+
+def project(matrix, points):
+    # Map (N, 2) model input pixels to frame pixels
+    return points @ matrix[:, :2].T + matrix[:, 2]
+
+def ssd_anchors(input_size, strides):
+    # Anchor centers in input pixels, in the order of the detector outputs.
+    # Every layer contributes two anchors per grid cell, and layers sharing a
+    # stride share a grid, as in MediaPipe's SsdAnchorsCalculator.
+    anchors = []
+    for stride, layers in itertools.groupby(strides):
+        grid = -(-input_size // stride)
+        centers = (np.arange(grid) + 0.5) * (input_size / grid)
+        ys, xs = np.meshgrid(centers, centers, indexing="ij")
+        cells = np.stack((xs.ravel(), ys.ravel()), axis=1)
+        anchors.append(np.repeat(cells, 2 * len(list(layers)), axis=0))
+    return np.concatenate(anchors)
+
+class OnnxModel:
+    # An ONNX Runtime session bound to fixed square NHWC float32 inputs, with
+    # pixel values mapped to value_range. Each of the `buffers` slots has its
+    # own host buffers, input tensor and I/O binding, so one slot can be
+    # uploaded while another is being inferred. On CUDA the input tensors
+    # live in device memory and are refreshed in place each frame, so no
+    # device buffers are allocated per run.
+
+    def __init__(self, path, providers, buffers=INPUT_BUFFERS, value_range=(0.0, 1.0)):
+        self.session = ort.InferenceSession(path, providers=providers)
+        model_input = self.session.get_inputs()[0]
+        shape = model_input.shape
+        if (len(shape) != 4 or not all(isinstance(dim, int) for dim in shape[1:])
+                or shape[1] != shape[2] or shape[3] != 3):
+            raise ValueError(
+                f"{path}: expected a static square NHWC RGB input, got {model_input.name}{shape}"
+            )
+        self.size = shape[1]
+        self.input_shape = (1, self.size, self.size, 3)
+        low, high = value_range
+        self._value_scale = (high - low) / 255.0
+        self._value_offset = low
+
+        device = "cuda" if CUDA_PROVIDERS & set(self.session.get_providers()) else "cpu"
+        self.crops = []
+        self.host_inputs = []
+        self.device_inputs = []
+        self.bindings = []
+        for _ in range(buffers):
+            host_input = np.zeros(self.input_shape, dtype=np.float32)
+            device_input = ort.OrtValue.ortvalue_from_shape_and_type(
+                self.input_shape, np.float32, device, 0
+            )
+            binding = self.session.io_binding()
+            binding.bind_ortvalue_input(model_input.name, device_input)
+            for output in self.session.get_outputs():
+                binding.bind_output(output.name, "cpu")
+            self.crops.append(np.zeros(self.input_shape[1:], dtype=np.uint8))
+            self.host_inputs.append(host_input)
+            self.device_inputs.append(device_input)
+            self.bindings.append(binding)
+
+    def upload(self, slot, rgb_frame, roi):
+        # Crop a ROI out of a frame into a slot, rotated upright and scaled to
+        # the input size, and copy it to the device. Parts of the ROI outside
+        # the frame are black. Returns the matrix mapping input pixels back to
+        # frame pixels (see roi_matrix).
+        matrix = roi_matrix(roi, self.size)
+        crop = self.crops[slot]
+        cv2.warpAffine(
+            rgb_frame, matrix, (self.size, self.size), dst=crop,
+            flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+            borderMode=cv2.BORDER_CONSTANT, borderValue=0,
+        )
+        host_input = self.host_inputs[slot]
+        np.multiply(crop, self._value_scale, out=host_input[0], casting="unsafe")
+        if self._value_offset:
+            host_input += self._value_offset
+        self.device_inputs[slot].update_inplace(host_input)
+        return matrix
+
+    def infer(self, slot):
+        # Run the model on a previously uploaded slot and return its outputs
+        binding = self.bindings[slot]
+        self.session.run_with_iobinding(binding)
+        return binding.copy_outputs_to_cpu()
+
+class BlendshapeModel:
+    # An ONNX Runtime session for MediaPipe's blendshape model, which maps
+    # face mesh landmarks in frame pixels to blendshape scores. Its input is a
+    # few hundred floats, so it runs on the CPU; a device round trip would
+    # cost more than the model itself.
+
+    def __init__(self, path):
+        self.session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        if tuple(model_input.shape[-2:]) != (len(BLENDSHAPE_LANDMARKS), 2):
+            raise ValueError(
+                f"{path}: expected a (1, {len(BLENDSHAPE_LANDMARKS)}, 2) landmark input, got {model_input.name}{model_input.shape}"
+            )
+        self.input_name = model_input.name
+
+    def infer(self, points):
+        # Return the blendshape scores for a (146, 2) float32 array
+        outputs = self.session.run(None, {self.input_name: points[np.newaxis]})
+        return outputs[0].reshape(-1)
+
+def sigmoid(x):
+    # Logits are clipped like MediaPipe's score clipping, so they cannot overflow
+    return 1.0 / (1.0 + np.exp(-np.clip(x, -100.0, 100.0)))
+
+class Detector:
+    # One of MediaPipe's SSD detectors, run on the whole letterboxed frame to
+    # find a subject when none is tracked. Only the best detection is kept,
+    # since a single face and pose are tracked.
+
+    def __init__(self, path, providers, strides):
+        self.model = OnnxModel(path, providers, buffers=1, value_range=(-1.0, 1.0))
+        self.anchors = ssd_anchors(self.model.size, strides)
+        boxes_shape = self.model.session.get_outputs()[DETECTOR_BOXES_OUTPUT].shape
+        if len(boxes_shape) != 3 or (isinstance(boxes_shape[1], int) and boxes_shape[1] != len(self.anchors)):
+            raise ValueError(
+                f"{path}: expected box regressors for {len(self.anchors)} anchors, got {boxes_shape}"
+            )
+
+    def detect(self, rgb_frame):
+        # Returns (box, keypoints) in frame pixels, box as its two corners,
+        # or None when nothing was detected
+        matrix = self.model.upload(0, rgb_frame, full_frame_roi(rgb_frame.shape))
+        outputs = self.model.infer(0)
+        scores = outputs[DETECTOR_SCORES_OUTPUT].reshape(-1)
+        best = int(np.argmax(scores))
+        if sigmoid(float(scores[best])) < DETECTION_THRESHOLD:
+            return None
+
+        raw = outputs[DETECTOR_BOXES_OUTPUT].reshape(len(self.anchors), -1)[best]
+        anchor = self.anchors[best]
+        center = anchor + raw[0:2]
+        half_size = raw[2:4] / 2
+        box = project(matrix, np.stack((center - half_size, center + half_size)))
+        keypoints = project(matrix, anchor + raw[4:].reshape(-1, 2))
+        return box, keypoints
+
+class RoiTracker:
+    # Chooses the region of the frame a landmark model sees, as MediaPipe
+    # does: while a subject is tracked, the ROI follows the landmarks of the
+    # latest inferred frame, otherwise the detector looks for one. With
+    # double buffering those landmarks can be a frame older than the frame
+    # being uploaded, which the ROI margin absorbs. next_roi is called by the
+    # upload stage, update by the inference stage.
+
+    def __init__(self, detector, detection_roi, landmarks_roi):
+        self._detector = detector
+        self._detection_roi = detection_roi
+        self._landmarks_roi = landmarks_roi
+        self._roi = None
+
+    def next_roi(self, rgb_frame):
+        # Returns None when no subject was found
+        roi = self._roi
+        if roi is None:
+            detection = self._detector.detect(rgb_frame)
+            if detection is not None:
+                roi = checked_roi(self._detection_roi(*detection))
+        return roi
+
+    def update(self, points):
+        # Track the landmarks (in frame pixels) of the latest frame, or start
+        # detecting again when points is None
+        self._roi = None if points is None else checked_roi(self._landmarks_roi(points))
+
+def face_landmarks(outputs, matrix):
+    # Face mesh landmarks as (x, y) frame pixels, or None when no face
+    presence = sigmoid(float(outputs[FACE_PRESENCE_OUTPUT].reshape(-1)[0]))
+    if presence < FACE_PRESENCE_THRESHOLD:
+        return None
+    landmarks = outputs[FACE_LANDMARKS_OUTPUT].reshape(-1, 3)[:FACE_NUM_LANDMARKS]
+    return project(matrix, landmarks[:, :2])
+
+def extract_face(points, blendshape_model):
+    if points is None:
+        return {}, None
+    # MediaPipe feeds the blendshape model frame pixels
+    scores = blendshape_model.infer(points[BLENDSHAPE_LANDMARKS].astype(np.float32))
+    return dict(zip(BLENDSHAPE_NAMES, scores.tolist())), None
+
+def extract_pose(outputs, matrix, frame_shape):
+    # Returns ((pose_landmarks, pose_world_landmarks), points), where points
+    # are all 39 landmarks as (x, y) frame pixels for tracking, or None when
+    # no pose was found
+    presence = sigmoid(float(outputs[POSE_PRESENCE_OUTPUT].reshape(-1)[0]))
+    if presence < POSE_PRESENCE_THRESHOLD:
+        return ([], []), None
+
+    frame_height, frame_width = frame_shape[:2]
+    # Scale and rotation of the ROI, from the first column of its matrix
+    scale = np.hypot(matrix[0, 0], matrix[1, 0])
+    cos, sin = matrix[0, 0] / scale, matrix[1, 0] / scale
+
+    raw = outputs[POSE_LANDMARKS_OUTPUT].reshape(-1, 5)
+    points = project(matrix, raw[:, :2])
+    count = POSE_NUM_LANDMARKS
+    pose_landmarks = np.empty((count, 5), dtype=np.float32)
+    # Normalize to the frame like MediaPipe does, with z on the x scale
+    pose_landmarks[:, 0] = points[:count, 0] / frame_width
+    pose_landmarks[:, 1] = points[:count, 1] / frame_height
+    pose_landmarks[:, 2] = raw[:count, 2] * scale / frame_width
+    pose_landmarks[:, 3:5] = sigmoid(raw[:count, 3:5])
+
+    # World landmarks are relative to the upright ROI; undo its rotation
+    world = outputs[POSE_WORLD_LANDMARKS_OUTPUT].reshape(-1, 3)[:count]
+    pose_world_landmarks = np.empty((count, 5), dtype=np.float32)
+    pose_world_landmarks[:, 0] = cos * world[:, 0] - sin * world[:, 1]
+    pose_world_landmarks[:, 1] = sin * world[:, 0] + cos * world[:, 1]
+    pose_world_landmarks[:, 2] = world[:, 2]
+    pose_world_landmarks[:, 3:5] = pose_landmarks[:, 3:5]
+
+    decimals = tracker.LANDMARK_DECIMALS
+    pose = (
+        np.round(pose_landmarks, decimals, out=pose_landmarks),
+        np.round(pose_world_landmarks, decimals, out=pose_world_landmarks),
+    )
+    return pose, points
+
+def upload_stage(face_model, face_tracker, pose_model, pose_tracker, sink, free_slots, uploaded, stop_event):
+    # Crops the face and pose ROIs of captured frames into a free input slot
+    # of both models and uploads them, overlapping with inference on the
+    # other slot. A model is skipped for a frame in which it has no ROI.
+    # A slot is claimed before taking a frame, so no frame is taken out of
+    # the capture queue (letting capture decode another one) only to wait
+    # for inference.
+    rgb_frame = None
+
+    while True:
+        slot = tracker.get_or_stop(free_slots, stop_event)
+        if slot is None:
+            return
+
+        item = tracker.get_or_stop(sink.frames, stop_event)
+        if item is None:
+            free_slots.put(slot)
+            return
+        frame, _, ts = item
+
+        if rgb_frame is None or rgb_frame.shape != frame.shape:
+            rgb_frame = np.empty_like(frame)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb_frame)
+        sink.pool.put(frame)
+
+        face_roi = face_tracker.next_roi(rgb_frame)
+        pose_roi = pose_tracker.next_roi(rgb_frame)
+        face_matrix = None if face_roi is None else face_model.upload(slot, rgb_frame, face_roi)
+        pose_matrix = None if pose_roi is None else pose_model.upload(slot, rgb_frame, pose_roi)
+        uploaded.put((slot, ts, face_matrix, pose_matrix, rgb_frame.shape))
+
+def inference_stage(face_model, face_tracker, blendshape_model, pose_model, pose_tracker, uploaded, free_slots, lines, stop_event):
+    # Runs the models on uploaded slots in order, frees the slot for the next
+    # upload, feeds the landmarks back to the ROI trackers and queues the
+    # encoded line
+    while True:
+        item = tracker.get_or_stop(uploaded, stop_event)
+        if item is None:
+            return
+        slot, ts, face_matrix, pose_matrix, frame_shape = item
+
+        face_outputs = None if face_matrix is None else face_model.infer(slot)
+        pose_outputs = None if pose_matrix is None else pose_model.infer(slot)
+        free_slots.put(slot)
+
+        face_points = None if face_outputs is None else face_landmarks(face_outputs, face_matrix)
+        face_tracker.update(face_points)
+        face = extract_face(face_points, blendshape_model)
+
+        pose, pose_points = ([], []), None
+        if pose_outputs is not None:
+            pose, pose_points = extract_pose(pose_outputs, pose_matrix, frame_shape)
+        pose_tracker.update(pose_points)
+
+        output = tracker.build_output(ts, face, pose)
+        lines.put(orjson.dumps(output, option=tracker.JSON_OPTIONS))
+
+def main():
+    parser = argparse.ArgumentParser(description="ONNX Runtime face and pose tracker")
+    parser.add_argument(
+        "--camera",
+        type=int,
+        default=0,
+        help="Video device index to use (default: 0)",
+    )
+    args = parser.parse_args()
+
+    for path in (
+        FACE_DETECTOR_MODEL_PATH, FACE_MODEL_PATH, BLENDSHAPE_MODEL_PATH,
+        POSE_DETECTOR_MODEL_PATH, POSE_MODEL_PATH,
+    ):
+        if not os.path.exists(path):
+            print(json.dumps({
+                "error": f"ONNX model file not found at {path}. See tools/README.md for how to export it."
+            }), file=sys.stderr, flush=True)
+            sys.exit(1)
+
+    # Incompatible models raise ValueError here; ONNX Runtime reports
+    # unreadable or invalid models with its own exception types
+    try:
+        providers = select_providers()
+        face_model = OnnxModel(FACE_MODEL_PATH, providers)
+        face_tracker = RoiTracker(
+            Detector(FACE_DETECTOR_MODEL_PATH, providers, FACE_DETECTOR_STRIDES),
+            face_detection_roi,
+            face_landmarks_roi,
+        )
+        blendshape_model = BlendshapeModel(BLENDSHAPE_MODEL_PATH)
+        pose_model = OnnxModel(POSE_MODEL_PATH, providers)
+        pose_tracker = RoiTracker(
+            Detector(POSE_DETECTOR_MODEL_PATH, providers, POSE_DETECTOR_STRIDES),
+            pose_detection_roi,
+            pose_landmarks_roi,
+        )
+    except Exception as e:
+        print(json.dumps({
+            "error": f"Failed to load ONNX models (see tools/README.md for the expected format): {e}"
+        }), file=sys.stderr, flush=True)
+        sys.exit(1)
+
+    cap = tracker.open_camera(args.camera)
+
+    sink = tracker.FrameQueueSink()
+    # Input slots shared by both models, cycled between upload and inference
+    free_slots = queue.Queue()
+    for slot in range(INPUT_BUFFERS):
+        free_slots.put(slot)
+    uploaded = queue.Queue()
+    lines = queue.Queue()
+    stop_event = threading.Event()
+    errors = []
+
+    stages = []
+    try:
+        stages.append(tracker.start_stage("capture", tracker.capture_stage, stop_event, cap, sink, stop_event, errors))
+        stages.append(tracker.start_stage("upload", upload_stage, stop_event, face_model, face_tracker, pose_model, pose_tracker, sink, free_slots, uploaded, stop_event))
+        stages.append(tracker.start_stage("inference", inference_stage, stop_event, face_model, face_tracker, blendshape_model, pose_model, pose_tracker, uploaded, free_slots, lines, stop_event))
+        stages.append(tracker.start_stage("writer", tracker.writer_stage, stop_event, lines, stop_event))
+        tracker.wait_for_stop(stop_event)
+    finally:
+        stop_event.set()
+        for stage in stages:
+            stage.join()
+        cap.release()
+
+    if errors:
+        print(json.dumps({"error": errors[0]}), file=sys.stderr, flush=True)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()